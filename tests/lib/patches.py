@@ -21,7 +21,6 @@
 from __future__ import annotations
 
 import asyncio
-import copy
 import os
 import subprocess
 import time
@@ -164,7 +163,11 @@ class InputDevice:
         return event
 
     def capabilities(self, absinfo=True, verbose=False):
-        result = copy.deepcopy(self._fixture.capabilities)
+        # the fixtures only contain lists of codes, copying those is enough to
+        # protect them from modifications and a lot faster than a deepcopy.
+        result = {
+            type_: list(codes) for type_, codes in self._fixture.capabilities.items()
+        }
 
         if absinfo and evdev.ecodes.EV_ABS in result:
             absinfo_obj = evdev.AbsInfo(
@@ -23,8 +23,9 @@
 from __future__ import annotations
 
 import multiprocessing
+import time
 from multiprocessing.connection import Connection
-from typing import Dict, Tuple
+from typing import Dict, List, Tuple
 
 from tests.lib.fixtures import Fixture
 from tests.lib.logger import logger
@@ -44,6 +45,24 @@ def read_write_history_pipe():
     return history
 
 
+def drain_history(min_count: int, timeout: float = 2.0) -> List[Tuple[int, int, int]]:
+    """Like read_write_history_pipe, but wait until min_count events arrived.
+
+    Returns as soon as enough events were read, or when the timeout is over.
+    Events that arrive afterwards stay in the pipe for the next call.
+    """
+    start = time.time()
+    history = []
+    while len(history) < min_count:
+        remaining = timeout - (time.time() - start)
+        if not uinput_write_history_pipe[0].poll(max(remaining, 0)):
+            break
+
+        event = uinput_write_history_pipe[0].recv()
+        history.append((event.type, event.code, event.value))
+    return history
+
+
 def setup_pipe(fixture: Fixture):
     """Create a pipe that can be used to send events to the reader-service,
     which in turn will be sent to the reader-client
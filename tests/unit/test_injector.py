@@ -27,13 +27,14 @@ from tests.lib.global_uinputs import (
 )
 from tests.lib.patches import uinputs
 from tests.lib.cleanup import quick_cleanup
-from tests.lib.constants import EVENT_READ_TIMEOUT
 from tests.lib.fixtures import fixtures
 from tests.lib.pipes import uinput_write_history_pipe
-from tests.lib.pipes import read_write_history_pipe, push_events
+from tests.lib.pipes import read_write_history_pipe, push_events, drain_history
 from tests.lib.fixtures import keyboard_keys
 
+import asyncio
 import unittest
+from functools import lru_cache
 from unittest import mock
 import time
 
@@ -77,6 +78,67 @@ def wait_for_uinput_write():
     return float(time.time() - start)
 
 
+def wait_until(predicate, timeout=2.0, interval=0.01):
+    """Poll until predicate returns True, or the timeout is over.
+
+    Returns the last result of predicate, so that callers can assert it.
+    """
+    start = time.time()
+    while not predicate():
+        if time.time() - start > timeout:
+            return predicate()
+        time.sleep(interval)
+    return True
+
+
+async def await_n_writes(n, timeout=2.0):
+    """Wait for n events in the write history without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, drain_history, n, timeout)
+
+
+@lru_cache(maxsize=None)
+def _device_hash(fixture_name: str) -> str:
+    return getattr(fixtures, fixture_name).get_device_hash()
+
+
+@lru_cache(maxsize=None)
+def _mk_input_config(type_, code, analog_threshold=None, origin_hash=None):
+    return InputConfig(
+        type=type_,
+        code=code,
+        analog_threshold=analog_threshold,
+        origin_hash=origin_hash,
+    )
+
+
+@lru_cache(maxsize=None)
+def _mk_combination(*configs) -> InputCombination:
+    """Each config is a tuple of arguments for _mk_input_config."""
+    return InputCombination([_mk_input_config(*config) for config in configs])
+
+
+@lru_cache(maxsize=None)
+def _mapping_template(combination, target_uinput, output_symbol) -> Mapping:
+    return Mapping.from_combination(combination, target_uinput, output_symbol)
+
+
+def _mk_mapping(combination, target_uinput="keyboard", output_symbol="a") -> Mapping:
+    """Get a validated mapping without validating it again on each call.
+
+    Presets and injectors modify their mappings, so this returns a copy.
+    """
+    return _mapping_template(combination, target_uinput, output_symbol).copy()
+
+
+def copy_preset(preset: Preset) -> Preset:
+    """Copy a preset for tests that modify its mappings, e.g. via _update_preset."""
+    copy = Preset()
+    for mapping in preset:
+        copy.add(mapping.copy())
+    return copy
+
+
 class TestInjector(unittest.IsolatedAsyncioTestCase):
     new_gamepad_path = "/dev/input/event100"
 
@@ -86,6 +148,22 @@ class TestInjector(unittest.IsolatedAsyncioTestCase):
         cls.grab = evdev.InputDevice.grab
         quick_cleanup()
 
+        # presets that are used by multiple tests without modifying them are
+        # only validated once
+        cls.foo_device_2_key10_preset = Preset()
+        cls.foo_device_2_key10_preset.add(
+            _mk_mapping(_mk_combination((EV_KEY, 10)), "keyboard", "a")
+        )
+
+        cls.gamepad_abs_hat0x_preset = Preset()
+        cls.gamepad_abs_hat0x_preset.add(
+            _mk_mapping(
+                _mk_combination((EV_ABS, ABS_HAT0X, 1, _device_hash("gamepad"))),
+                "keyboard",
+                "a",
+            )
+        )
+
     def setUp(self):
         self.failed = 0
         self.make_it_fail = 2
@@ -100,10 +178,13 @@ class TestInjector(unittest.IsolatedAsyncioTestCase):
     def tearDown(self):
         if self.injector is not None and self.injector.is_alive():
             self.injector.stop_injecting()
-            time.sleep(0.2)
-            self.assertIn(
-                self.injector.get_state(),
-                (InjectorState.STOPPED, InjectorState.FAILED, InjectorState.NO_GRAB),
+            stopped_states = (
+                InjectorState.STOPPED,
+                InjectorState.FAILED,
+                InjectorState.NO_GRAB,
+            )
+            self.assertTrue(
+                wait_until(lambda: self.injector.get_state() in stopped_states)
             )
             self.injector = None
         evdev.InputDevice.grab = self.grab
@@ -118,14 +199,7 @@ class TestInjector(unittest.IsolatedAsyncioTestCase):
     def test_grab(self):
         # path is from the fixtures
         path = "/dev/input/event10"
-        preset = Preset()
-        preset.add(
-            Mapping.from_combination(
-                InputCombination([InputConfig(type=EV_KEY, code=10)]),
-                "keyboard",
-                "a",
-            )
-        )
+        preset = self.foo_device_2_key10_preset
 
         self.injector = Injector(groups.find(key="Foo Device 2"), preset)
         # this test needs to pass around all other constraints of
@@ -140,16 +214,12 @@ class TestInjector(unittest.IsolatedAsyncioTestCase):
 
     def test_fail_grab(self):
         self.make_it_fail = 999
-        preset = Preset()
-        preset.add(
-            Mapping.from_combination(
-                InputCombination([InputConfig(type=EV_KEY, code=10)]),
-                "keyboard",
-                "a",
-            )
-        )
+        preset = self.foo_device_2_key10_preset
 
         self.injector = Injector(groups.find(key="Foo Device 2"), preset)
+        # this test is about giving up, not about how long to wait between
+        # attempts. The process inherits this attribute.
+        self.injector.regrab_timeout = 0.001
         path = "/dev/input/event10"
         self.injector.context = Context(preset, {}, {})
         device = self.injector._grab_device(evdev.InputDevice(path))
@@ -159,32 +229,14 @@ class TestInjector(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(self.injector.get_state(), InjectorState.UNKNOWN)
         self.injector.start()
         self.assertEqual(self.injector.get_state(), InjectorState.STARTING)
-        # since none can be grabbed, the process will terminate. But that
-        # actually takes quite some time.
-        time.sleep(self.injector.regrab_timeout * 12)
-        self.assertFalse(self.injector.is_alive())
+        # since none can be grabbed, the process will terminate
+        self.assertTrue(wait_until(lambda: not self.injector.is_alive()))
         self.assertEqual(self.injector.get_state(), InjectorState.NO_GRAB)
 
     def test_grab_device_1(self):
-        device_hash = fixtures.gamepad.get_device_hash()
+        device_hash = _device_hash("gamepad")
 
-        preset = Preset()
-        preset.add(
-            Mapping.from_combination(
-                InputCombination(
-                    [
-                        InputConfig(
-                            type=EV_ABS,
-                            code=ABS_HAT0X,
-                            analog_threshold=1,
-                            origin_hash=device_hash,
-                        )
-                    ]
-                ),
-                "keyboard",
-                "a",
-            ),
-        )
+        preset = copy_preset(self.gamepad_abs_hat0x_preset)
         self.initialize_injector(groups.find(name="gamepad"), preset)
         self.injector.context = Context(preset, {}, {})
         self.injector.group.paths = [
@@ -198,15 +250,13 @@ class TestInjector(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(grabbed[device_hash].path, "/dev/input/event30")
 
     def test_forward_gamepad_events(self):
-        device_hash = fixtures.gamepad.get_device_hash()
+        device_hash = _device_hash("gamepad")
 
         # forward abs joystick events
         preset = Preset()
         preset.add(
-            Mapping.from_combination(
-                input_combination=InputCombination(
-                    [InputConfig(type=EV_KEY, code=BTN_A, origin_hash=device_hash)]
-                ),
+            _mk_mapping(
+                _mk_combination((EV_KEY, BTN_A, None, device_hash)),
                 target_uinput="keyboard",
                 output_symbol="a",
             ),
@@ -224,14 +274,7 @@ class TestInjector(unittest.IsolatedAsyncioTestCase):
 
     def test_skip_unused_device(self):
         # skips a device because its capabilities are not used in the preset
-        preset = Preset()
-        preset.add(
-            Mapping.from_combination(
-                InputCombination([InputConfig(type=EV_KEY, code=10)]),
-                "keyboard",
-                "a",
-            )
-        )
+        preset = copy_preset(self.foo_device_2_key10_preset)
         self.initialize_injector(groups.find(key="Foo Device 2"), preset)
         self.injector.context = Context(preset, {}, {})
 
@@ -242,13 +285,7 @@ class TestInjector(unittest.IsolatedAsyncioTestCase):
 
     def test_skip_unknown_device(self):
         preset = Preset()
-        preset.add(
-            Mapping.from_combination(
-                InputCombination([InputConfig(type=EV_KEY, code=1234)]),
-                "keyboard",
-                "a",
-            )
-        )
+        preset.add(_mk_mapping(_mk_combination((EV_KEY, 1234)), "keyboard", "a"))
 
         # skips a device because its capabilities are not used in the preset
         self.initialize_injector(groups.find(key="Foo Device 2"), preset)
@@ -259,85 +296,24 @@ class TestInjector(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(self.failed, 0)
         self.assertEqual(devices, {})
 
-    def test_get_udev_name(self):
-        self.injector = Injector(groups.find(key="Foo Device 2"), Preset())
-        suffix = "mapped"
-        prefix = "input-remapper"
-        expected = f'{prefix} {"a" * (80 - len(suffix) - len(prefix) - 2)} {suffix}'
-        self.assertEqual(len(expected), 80)
-        self.assertEqual(get_udev_name("a" * 100, suffix), expected)
-
-        self.injector.device = "abcd"
-        self.assertEqual(
-            get_udev_name("abcd", "forwarded"),
-            "input-remapper abcd forwarded",
-        )
-
     @mock.patch("evdev.InputDevice.ungrab")
     def test_capabilities_and_uinput_presence(self, ungrab_patch):
+        keyboard_hash = _device_hash("foo_device_2_keyboard")
+        mouse_hash = _device_hash("foo_device_2_mouse")
+
         preset = Preset()
-        m1 = Mapping.from_combination(
-            InputCombination(
-                [
-                    InputConfig(
-                        type=EV_KEY,
-                        code=KEY_A,
-                        origin_hash=fixtures.foo_device_2_keyboard.get_device_hash(),
-                    )
-                ]
-            ),
-            "keyboard",
-            "c",
-        )
-        m2 = Mapping.from_combination(
-            InputCombination(
-                [
-                    InputConfig(
-                        type=EV_REL,
-                        code=REL_HWHEEL,
-                        analog_threshold=1,
-                        origin_hash=fixtures.foo_device_2_mouse.get_device_hash(),
-                    )
-                ]
-            ),
-            "keyboard",
-            "key(b)",
-        )
+        combination_1 = _mk_combination((EV_KEY, KEY_A, None, keyboard_hash))
+        combination_2 = _mk_combination((EV_REL, REL_HWHEEL, 1, mouse_hash))
+        m1 = _mk_mapping(combination_1, "keyboard", "c")
+        m2 = _mk_mapping(combination_2, "keyboard", "key(b)")
         preset.add(m1)
         preset.add(m2)
         self.injector = Injector(groups.find(key="Foo Device 2"), preset)
         self.injector.stop_injecting()
         self.injector.run()
 
-        self.assertEqual(
-            self.injector.preset.get_mapping(
-                InputCombination(
-                    [
-                        InputConfig(
-                            type=EV_KEY,
-                            code=KEY_A,
-                            origin_hash=fixtures.foo_device_2_keyboard.get_device_hash(),
-                        )
-                    ]
-                )
-            ),
-            m1,
-        )
-        self.assertEqual(
-            self.injector.preset.get_mapping(
-                InputCombination(
-                    [
-                        InputConfig(
-                            type=EV_REL,
-                            code=REL_HWHEEL,
-                            analog_threshold=1,
-                            origin_hash=fixtures.foo_device_2_mouse.get_device_hash(),
-                        )
-                    ]
-                )
-            ),
-            m2,
-        )
+        self.assertEqual(self.injector.preset.get_mapping(combination_1), m1)
+        self.assertEqual(self.injector.preset.get_mapping(combination_2), m2)
 
         # reading and preventing original events from reaching the
         # display server
@@ -353,69 +329,44 @@ class TestInjector(unittest.IsolatedAsyncioTestCase):
 
         self.assertEqual(ungrab_patch.call_count, 2)
 
-    def test_injector(self):
+    async def test_injector(self):
         numlock_before = is_numlock_on()
+        keyboard_hash = _device_hash("foo_device_2_keyboard")
+        gamepad_hash = _device_hash("foo_device_2_gamepad")
 
         # stuff the preset outputs
         system_mapping.clear()
         code_a = 100
         code_q = 101
         code_w = 102
-        system_mapping._set("a", code_a)
-        system_mapping._set("key_q", code_q)
-        system_mapping._set("w", code_w)
+        system_mapping.update({"a": code_a, "key_q": code_q, "w": code_w})
 
         preset = Preset()
         preset.add(
-            Mapping.from_combination(
-                InputCombination(
-                    [
-                        InputConfig(
-                            type=EV_KEY,
-                            code=8,
-                            origin_hash=fixtures.foo_device_2_keyboard.get_device_hash(),
-                        ),
-                        InputConfig(
-                            type=EV_KEY,
-                            code=9,
-                            origin_hash=fixtures.foo_device_2_keyboard.get_device_hash(),
-                        ),
-                    ]
+            _mk_mapping(
+                _mk_combination(
+                    (EV_KEY, 8, None, keyboard_hash),
+                    (EV_KEY, 9, None, keyboard_hash),
                 ),
                 "keyboard",
                 "k(KEY_Q).k(w)",
             )
         )
         preset.add(
-            Mapping.from_combination(
-                InputCombination(
-                    [
-                        InputConfig(
-                            type=EV_ABS,
-                            code=ABS_HAT0X,
-                            analog_threshold=-1,
-                            origin_hash=fixtures.foo_device_2_gamepad.get_device_hash(),
-                        )
-                    ]
-                ),
+            _mk_mapping(
+                _mk_combination((EV_ABS, ABS_HAT0X, -1, gamepad_hash)),
                 "keyboard",
                 "a",
             )
         )
-        # one mapping that is unknown in the system_mapping on purpose
+        # one mapping that is unknown in the system_mapping on purpose.
+        # Not cached, because it has to be validated against the current
+        # system_mapping.
         input_b = 10
         with self.assertRaises(ValidationError):
             preset.add(
                 Mapping.from_combination(
-                    InputCombination(
-                        [
-                            InputConfig(
-                                type=EV_KEY,
-                                code=input_b,
-                                origin_hash=fixtures.foo_device_2_keyboard.get_device_hash(),
-                            )
-                        ]
-                    ),
+                    _mk_combination((EV_KEY, input_b, None, keyboard_hash)),
                     "keyboard",
                     "b",
                 )
@@ -426,9 +377,9 @@ class TestInjector(unittest.IsolatedAsyncioTestCase):
         self.injector.start()
         self.assertEqual(self.injector.get_state(), InjectorState.STARTING)
 
-        uinput_write_history_pipe[0].poll(timeout=1)
+        # the injector process reports its state through the message pipe
+        self.assertTrue(self.injector._msg_pipe[1].poll(2))
         self.assertEqual(self.injector.get_state(), InjectorState.RUNNING)
-        time.sleep(EVENT_READ_TIMEOUT * 10)
 
         push_events(
             fixtures.foo_device_2_keyboard,
@@ -441,7 +392,9 @@ class TestInjector(unittest.IsolatedAsyncioTestCase):
             ],
         )
 
-        time.sleep(0.1)  # give a chance that everything arrives in order
+        # wait for everything to arrive to keep the order. 1 forwarded event,
+        # 2 released by the combination handler, 4 from the macro and 1 release.
+        history = await await_n_writes(8)
         push_events(
             fixtures.foo_device_2_gamepad,
             [
@@ -451,7 +404,7 @@ class TestInjector(unittest.IsolatedAsyncioTestCase):
             ],
         )
 
-        time.sleep(0.1)
+        history += await await_n_writes(2)
         push_events(
             fixtures.foo_device_2_keyboard,
             [
@@ -464,15 +417,12 @@ class TestInjector(unittest.IsolatedAsyncioTestCase):
         )
 
         # the injector needs time to process this
-        time.sleep(0.1)
+        history += await await_n_writes(3)
 
         # sending anything arbitrary does not stop the process
         # (is_alive checked later after some time)
         self.injector._msg_pipe[1].send(1234)
 
-        # convert the write history to some easier to manage list
-        history = read_write_history_pipe()
-
         # 1 event before the combination was triggered
         # 2 events for releasing the combination trigger (by combination handler)
         # 4 events for the macro
@@ -483,31 +433,34 @@ class TestInjector(unittest.IsolatedAsyncioTestCase):
 
         # the first bit is ordered properly
         self.assertEqual(history[0], (EV_KEY, 8, 1))  # forwarded
-        del history[0]
-        self.assertIn((EV_KEY, 8, 0), history[0:2])  # released by combination handler
-        self.assertIn((EV_KEY, 9, 0), history[0:2])  # released by combination handler
-        del history[0]
-        del history[0]
+        self.assertIn((EV_KEY, 8, 0), history[1:3])  # released by combination handler
+        self.assertIn((EV_KEY, 9, 0), history[1:3])  # released by combination handler
+        history = history[3:]
 
         # since the macro takes a little bit of time to execute, its
         # keystrokes are all over the place.
         # just check if they are there and if so, remove them from the list.
         # the macro itself
-        self.assertIn((EV_KEY, code_q, 1), history)
-        self.assertIn((EV_KEY, code_q, 0), history)
-        self.assertIn((EV_KEY, code_w, 1), history)
-        self.assertIn((EV_KEY, code_w, 0), history)
-        index_q_1 = history.index((EV_KEY, code_q, 1))
-        index_q_0 = history.index((EV_KEY, code_q, 0))
-        index_w_1 = history.index((EV_KEY, code_w, 1))
-        index_w_0 = history.index((EV_KEY, code_w, 0))
-        self.assertGreater(index_q_0, index_q_1)
-        self.assertGreater(index_w_1, index_q_0)
-        self.assertGreater(index_w_0, index_w_1)
-        del history[index_w_0]
-        del history[index_w_1]
-        del history[index_q_0]
-        del history[index_q_1]
+        macro_events = {
+            (EV_KEY, code_q, 1),
+            (EV_KEY, code_q, 0),
+            (EV_KEY, code_w, 1),
+            (EV_KEY, code_w, 0),
+        }
+        positions = {
+            event: i for i, event in enumerate(history) if event in macro_events
+        }
+        self.assertEqual(positions.keys(), macro_events)
+        self.assertGreater(
+            positions[(EV_KEY, code_q, 0)], positions[(EV_KEY, code_q, 1)]
+        )
+        self.assertGreater(
+            positions[(EV_KEY, code_w, 1)], positions[(EV_KEY, code_q, 0)]
+        )
+        self.assertGreater(
+            positions[(EV_KEY, code_w, 0)], positions[(EV_KEY, code_w, 1)]
+        )
+        history = [event for event in history if event not in macro_events]
 
         # the rest should be in order now.
         # first the released combination key which did not release the macro.
@@ -521,119 +474,118 @@ class TestInjector(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(history[4], (EV_KEY, input_b, 0))
         self.assertEqual(history[5], (3124, 3564, 6542))
 
-        time.sleep(0.1)
+        await asyncio.sleep(0.1)
         self.assertTrue(self.injector.is_alive())
+        # nothing unexpected arrived late
+        self.assertEqual(read_write_history_pipe(), [])
 
         numlock_after = is_numlock_on()
         self.assertEqual(numlock_before, numlock_after)
         self.assertEqual(self.injector.get_state(), InjectorState.RUNNING)
 
-    def test_is_in_capabilities(self):
-        key = InputCombination(InputCombination.from_tuples((1, 2, 1)))
-        capabilities = {1: [9, 2, 5]}
-        self.assertTrue(is_in_capabilities(key, capabilities))
 
-        key = InputCombination(InputCombination.from_tuples((1, 2, 1), (1, 3, 1)))
+class TestInjectorUtils(unittest.TestCase):
+    """Tests for functions that don't need any cleanup afterwards."""
+
+    def test_get_udev_name(self):
+        suffix = "mapped"
+        prefix = "input-remapper"
+        expected = f'{prefix} {"a" * (80 - len(suffix) - len(prefix) - 2)} {suffix}'
+        self.assertEqual(len(expected), 80)
+        self.assertEqual(get_udev_name("a" * 100, suffix), expected)
+
+        self.assertEqual(
+            get_udev_name("abcd", "forwarded"),
+            "input-remapper abcd forwarded",
+        )
+
+    def test_is_in_capabilities(self):
         capabilities = {1: [9, 2, 5]}
         # only one of the codes of the combination is required.
         # The goal is to make combinations= across those sub-devices possible,
         # that make up one hardware device
-        self.assertTrue(is_in_capabilities(key, capabilities))
-
-        key = InputCombination(InputCombination.from_tuples((1, 2, 1), (1, 5, 1)))
-        capabilities = {1: [9, 2, 5]}
-        self.assertTrue(is_in_capabilities(key, capabilities))
+        for tuples in [
+            [(1, 2, 1)],
+            [(1, 2, 1), (1, 3, 1)],
+            [(1, 2, 1), (1, 5, 1)],
+        ]:
+            with self.subTest(tuples=tuples):
+                key = InputCombination(InputCombination.from_tuples(*tuples))
+                self.assertTrue(is_in_capabilities(key, capabilities))
 
 
 class TestModifyCapabilities(unittest.TestCase):
-    @classmethod
-    def setUpClass(cls):
-        quick_cleanup()
-
-    def setUp(self):
-        class FakeDevice:
-            def __init__(self):
-                self._capabilities = {
-                    evdev.ecodes.EV_SYN: [1, 2, 3],
-                    evdev.ecodes.EV_FF: [1, 2, 3],
-                    EV_ABS: [
-                        (
-                            1,
-                            evdev.AbsInfo(
-                                value=None,
-                                min=None,
-                                max=1234,
-                                fuzz=None,
-                                flat=None,
-                                resolution=None,
-                            ),
+    class FakeDevice:
+        def __init__(self):
+            self._capabilities = {
+                evdev.ecodes.EV_SYN: [1, 2, 3],
+                evdev.ecodes.EV_FF: [1, 2, 3],
+                EV_ABS: [
+                    (
+                        1,
+                        evdev.AbsInfo(
+                            value=None,
+                            min=None,
+                            max=1234,
+                            fuzz=None,
+                            flat=None,
+                            resolution=None,
                         ),
-                        (
-                            2,
-                            evdev.AbsInfo(
-                                value=None,
-                                min=50,
-                                max=2345,
-                                fuzz=None,
-                                flat=None,
-                                resolution=None,
-                            ),
+                    ),
+                    (
+                        2,
+                        evdev.AbsInfo(
+                            value=None,
+                            min=50,
+                            max=2345,
+                            fuzz=None,
+                            flat=None,
+                            resolution=None,
                         ),
-                        3,
-                    ],
-                }
+                    ),
+                    3,
+                ],
+            }
 
-            def capabilities(self, absinfo=False):
-                assert absinfo is True
-                return self._capabilities
+        def capabilities(self, absinfo=False):
+            assert absinfo is True
+            return self._capabilities
+
+    @classmethod
+    def setUpClass(cls):
+        quick_cleanup()
 
+        # the tests don't modify the preset, so it is only built once
         preset = Preset()
+        preset.add(_mk_mapping(_mk_combination((EV_KEY, 80)), "keyboard", "a"))
         preset.add(
-            Mapping.from_combination(
-                InputCombination([InputConfig(type=EV_KEY, code=80)]),
-                "keyboard",
-                "a",
-            )
-        )
-        preset.add(
-            Mapping.from_combination(
-                InputCombination([InputConfig(type=EV_KEY, code=81)]),
-                "keyboard",
-                DISABLE_NAME,
-            ),
+            _mk_mapping(_mk_combination((EV_KEY, 81)), "keyboard", DISABLE_NAME),
         )
 
         macro_code = "r(2, m(sHiFt_l, r(2, k(1).k(2))))"
         macro = parse(macro_code, preset)
 
         preset.add(
-            Mapping.from_combination(
-                InputCombination([InputConfig(type=EV_KEY, code=60)]),
-                "keyboard",
-                macro_code,
-            ),
+            _mk_mapping(_mk_combination((EV_KEY, 60)), "keyboard", macro_code),
         )
 
         # going to be ignored, because EV_REL cannot be mapped, that's
         # mouse movements.
         preset.add(
-            Mapping.from_combination(
-                InputCombination(
-                    [InputConfig(type=EV_REL, code=1234, analog_threshold=3)]
-                ),
-                "keyboard",
-                "b",
-            ),
+            _mk_mapping(_mk_combination((EV_REL, 1234, 3)), "keyboard", "b"),
         )
 
-        self.a = system_mapping.get("a")
-        self.shift_l = system_mapping.get("ShIfT_L")
-        self.one = system_mapping.get(1)
-        self.two = system_mapping.get("2")
-        self.left = system_mapping.get("BtN_lEfT")
-        self.fake_device = FakeDevice()
-        self.preset = preset
-        self.macro = macro
+        cls.a = system_mapping.get("a")
+        cls.shift_l = system_mapping.get("ShIfT_L")
+        cls.one = system_mapping.get(1)
+        cls.two = system_mapping.get("2")
+        cls.left = system_mapping.get("BtN_lEfT")
+        cls.preset = preset
+        cls.macro = macro
+
+    def setUp(self):
+        # tests may modify the capabilities of the device
+        self.fake_device = self.FakeDevice()
 
     def check_keys(self, capabilities):
         """No matter the configuration, EV_KEY will be mapped to EV_KEY."""
@@ -645,9 +597,6 @@ class TestModifyCapabilities(unittest.TestCase):
         self.assertIn(self.shift_l, keys)
         self.assertNotIn(DISABLE_CODE, keys)
 
-    def tearDown(self):
-        quick_cleanup()
-
     def test_copy_capabilities(self):
         # I don't know what ABS_VOLUME is, for now I would like to just always
         # remove it until somebody complains, since its presence broke stuff